@@ -8,22 +8,35 @@ Schema-based Postgres persistence:
  - recent_trades (id PK)
  - monthly_winners (month PK, data JSONB)
 If DATABASE_URL or psycopg2 is unavailable, falls back to existing local JSON seed file behavior.
+
+Run with uvloop + httptools (installed by uvicorn[standard]):
+    python main.py
+or
+    uvicorn main:app --loop uvloop --http httptools
+The file fallback keeps the DB cached per process, so only raise WEB_CONCURRENCY
+above 1 when running against Postgres.
 """
 import os
+import asyncio
+import contextlib
 import json
-import threading
+import math
+import itertools
+from collections import defaultdict, deque
 import hashlib
 import hmac
-from fastapi import Body
 import secrets
 import time
 from datetime import datetime, timedelta, timezone
-from typing import Optional, Dict, Any, List
-from fastapi import FastAPI, HTTPException, Header, Depends, status
+from typing import Optional, Dict, Any, List, TypedDict
+from fastapi import FastAPI, HTTPException, Header, Depends, Request, status
 from fastapi.responses import FileResponse, JSONResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
+from fastapi.middleware.gzip import GZipMiddleware
+from pydantic import BaseModel
+import orjson
+from sortedcontainers import SortedKeyList
 import logging
 import shutil
 import decimal
@@ -41,6 +54,7 @@ logging.basicConfig(level=logging.INFO)
 # ---- config ----
 SEED_DB_PATH = os.path.join(os.path.dirname(__file__), "leaderboard.json")
 START_BALANCE = 5000.0
+MAX_RECENT_TRADES = 500
 DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
 DB_PATH = os.path.join(DATA_DIR, "leaderboard.json")
 STATIC_DIR = os.path.join(os.path.dirname(__file__), "static")
@@ -50,30 +64,65 @@ if not os.path.exists(DATA_DIR):
 if not os.path.exists(STATIC_DIR):
     os.makedirs(STATIC_DIR, exist_ok=True)
 
-_lock = threading.Lock()
+_lock = asyncio.Lock()  # guards _DB and serializes DB work; handlers run on the event loop
 SESSION_TTL_SECONDS = int(os.environ.get("SESSION_TTL_SECONDS", 7 * 24 * 3600))  # default 7 days
+FLUSH_INTERVAL_SECONDS = float(os.environ.get("FLUSH_INTERVAL_SECONDS", 0.5))
+
+_ts_cache = (-1, "")
 
 def _now_iso():
-    # Return ISO with explicit Z (UTC)
-    return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+    # Return ISO with explicit Z (UTC), second precision; formatted at most once per second
+    global _ts_cache
+    sec = int(time.time())
+    if sec != _ts_cache[0]:
+        _ts_cache = (sec, time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(sec)))
+    return _ts_cache[1]
 
 def _now_ts():
     # Return aware datetime in UTC for DB insertions
     return datetime.now(timezone.utc)
 
+def _year_month(dt: Optional[datetime]=None):
+    # fixed "YYYY-MM" keys don't need a datetime + strftime; gmtime is enough
+    if dt is not None:
+        return dt.year, dt.month
+    t = time.gmtime()
+    return t.tm_year, t.tm_mon
+
 def _get_month_key(dt: Optional[datetime]=None) -> str:
-    dt = dt or datetime.now(timezone.utc)
-    return dt.strftime("%Y-%m")
+    y, m = _year_month(dt)
+    return f"{y:04d}-{m:02d}"
 
 def _prev_month_key(dt: Optional[datetime]=None) -> str:
-    dt = dt or datetime.now(timezone.utc)
-    first = dt.replace(day=1)
-    prev_last = first - timedelta(days=1)
-    return prev_last.strftime("%Y-%m")
+    y, m = _year_month(dt)
+    m -= 1
+    if m == 0:
+        y, m = y - 1, 12
+    return f"{y:04d}-{m:02d}"
 
 # ---------------------------
-# File fallback helpers (unchanged original behavior)
+# File fallback helpers
+# The parsed JSON file is cached in _DB; handlers mutate it in place under _lock
+# and it is only re-read from disk when the file's mtime changes.
 # ---------------------------
+_DB: Optional[Dict[str, Any]] = None
+_DB_MTIME: Optional[int] = None
+_dirty = False  # _DB has mutations not yet flushed to disk
+_DB_UNREADABLE = False  # DB_PATH exists but failed to parse: never flush a default over it
+_write_in_progress = False  # a snapshot is being written with _lock released
+_write_lock = asyncio.Lock()  # keeps snapshots hitting disk in the order they were taken
+_flush_task: Optional[asyncio.Task] = None
+
+# Leaderboard index over _DB["users"]: (balance, username, row) entries kept sorted by
+# balance desc, so a leaderboard read is a slice instead of a full sort. `row` is the
+# user's response-shaped leaderboard dict; it is replaced, never mutated, on update.
+_leaderboard = SortedKeyList(key=lambda e: (-e[0], e[1]))
+_board_entries: Dict[str, tuple] = {}
+
+# username -> that user's entries in _DB["recent_trades"], oldest first, so a
+# nickname change only touches the user's own trades.
+_recent_by_user: Dict[str, deque] = defaultdict(deque)
+
 def _default_db():
     return {
         "users": {},
@@ -83,15 +132,40 @@ def _default_db():
         "auth": {"users": {}, "sessions": {}}
     }
 
-def _read_db_file_fallback() -> Dict[str, Any]:
+def _db_file_mtime() -> Optional[int]:
+    try:
+        return os.stat(DB_PATH).st_mtime_ns
+    except OSError:
+        return None
+
+def _drop_non_finite(obj):
+    if isinstance(obj, float):
+        return obj if math.isfinite(obj) else None
+    if isinstance(obj, dict):
+        return {k: _drop_non_finite(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [_drop_non_finite(v) for v in obj]
+    return obj
+
+def _parse_db_bytes(raw: bytes) -> Dict[str, Any]:
+    try:
+        return orjson.loads(raw)
+    except orjson.JSONDecodeError:
+        # files written by the old stdlib json.dump may hold NaN/Infinity, which orjson
+        # rejects; read those with json and null the non-finite values (read as defaults)
+        return _drop_non_finite(json.loads(raw))
+
+def _load_db_file() -> Dict[str, Any]:
+    global _DB_UNREADABLE
+    _DB_UNREADABLE = False
     if not os.path.exists(DB_PATH):
         try:
             if os.path.exists(SEED_DB_PATH):
                 os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
                 shutil.copyfile(SEED_DB_PATH, DB_PATH)
                 logger.info(f"Copied seed DB from {SEED_DB_PATH} -> {DB_PATH}")
-                with open(DB_PATH, "r", encoding="utf-8") as f:
-                    data = json.load(f)
+                with open(DB_PATH, "rb") as f:
+                    data = _parse_db_bytes(f.read())
                     data.setdefault("auth", {"users": {}, "sessions": {}})
                     return data
         except Exception as e:
@@ -99,38 +173,186 @@ def _read_db_file_fallback() -> Dict[str, Any]:
         default = _default_db()
         try:
             os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-            with open(DB_PATH, "w", encoding="utf-8") as f:
-                json.dump(default, f, indent=2)
+            with open(DB_PATH, "wb") as f:
+                f.write(_dump_db_file(default))
             logger.info(f"Created new default DB at {DB_PATH}")
         except Exception as e:
             logger.warning(f"Failed to create DB file at {DB_PATH}: {e}")
         return default
     try:
-        with open(DB_PATH, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        with open(DB_PATH, "rb") as f:
+            data = _parse_db_bytes(f.read())
             data.setdefault("auth", {"users": {}, "sessions": {}})
             return data
     except Exception as e:
-        logger.warning(f"Failed to read DB at {DB_PATH} ({e}), returning default DB")
+        logger.error(
+            f"Failed to read DB at {DB_PATH} ({e}), serving a default DB; the file will not be "
+            f"overwritten and changes stay in memory until it is readable again"
+        )
+        _DB_UNREADABLE = True
         return _default_db()
 
-def _write_db_file_fallback(data: Dict[str, Any]):
+def _board_update(username: str, u: Dict[str, Any]):
+    # Call after _recompute(u) whenever a cached user changes (O(log N)).
+    try:
+        balance = round(float(u.get("balance", START_BALANCE)), 2)
+    except Exception:
+        balance = START_BALANCE
+    if not math.isfinite(balance):
+        balance = START_BALANCE  # a NaN key would break the SortedKeyList ordering
+    old = _board_entries.get(username)
+    if old is not None:
+        _leaderboard.remove(old)
+    row = {
+        "username": username,
+        "nickname": u.get("nickname", "") or "",
+        "balance": balance,
+        "performance": u.get("performance", 0.0),
+        "win_rate": u.get("win_rate", 0.0),
+        "trades_this_period": u.get("trades", 0)
+    }
+    entry = (balance, username, row)
+    _leaderboard.add(entry)
+    _board_entries[username] = entry
+
+def _board_rebuild(users: Dict[str, Any], recompute: bool = True):
+    _leaderboard.clear()
+    _board_entries.clear()
+    for uname, u in users.items():
+        if recompute:
+            _recompute(u)
+        _board_update(uname, u)
+
+def _recent_add(db: Dict[str, Any], entry: Dict[str, Any]):
+    # recent_trades is a bounded deque (see _read_db_file_fallback): appendleft is O(1)
+    # and evicts the oldest entry, which must also leave its user's index.
+    recent = db["recent_trades"]
+    if len(recent) == recent.maxlen and isinstance(recent[-1], dict):
+        evicted = recent[-1]
+        mine = _recent_by_user.get(evicted.get("username"))
+        if mine:
+            if mine[0] is evicted:
+                mine.popleft()
+            else:
+                try:
+                    mine.remove(evicted)
+                except ValueError:
+                    pass
+            if not mine:
+                del _recent_by_user[evicted.get("username")]
+    recent.appendleft(entry)
+    _recent_by_user[entry.get("username")].append(entry)
+
+def _recent_rebuild(recent):
+    _recent_by_user.clear()
+    for ent in reversed(recent):
+        if isinstance(ent, dict):
+            _recent_by_user[ent.get("username")].append(ent)
+            if "ts_epoch" not in ent:
+                # entries written before ts_epoch existed: parse their ISO ts once here
+                dt = _iso_to_dt(ent.get("ts"))
+                ent["ts_epoch"] = int(dt.timestamp()) if dt else 0
+
+def _read_db_file_fallback() -> Dict[str, Any]:
+    global _DB_MTIME
+    mtime = _db_file_mtime()
+    # never reload over unflushed in-memory changes (unless they sit on top of an unreadable
+    # file), or mid-write from our own flush
+    if _DB is None or ((not _dirty or _DB_UNREADABLE) and not _write_in_progress
+                       and mtime is not None and mtime != _DB_MTIME):
+        _install_db(_load_db_file())
+        _DB_MTIME = _db_file_mtime()
+    return _DB
+
+def _install_db(data: Dict[str, Any]):
+    # Make `data` the cached DB and rebuild the in-memory indexes derived from it.
+    global _DB
+    _DB = data
+    # the list is newest-first: keep its head (a plain maxlen deque would keep the tail)
+    _DB["recent_trades"] = deque(
+        itertools.islice(_DB.get("recent_trades") or (), MAX_RECENT_TRADES), maxlen=MAX_RECENT_TRADES
+    )
+    _recent_rebuild(_DB["recent_trades"])
+    _board_rebuild(_DB.setdefault("users", {}))
+
+def _mark_dirty():
+    # Handlers call this instead of writing; the background flusher persists _DB.
+    global _dirty
+    _dirty = True
+
+def _orjson_default(obj):
+    if isinstance(obj, deque):
+        return list(obj)
+    raise TypeError
+
+def _dump_db_file(data: Dict[str, Any]) -> Optional[bytes]:
+    # compact output: the file is only ever read back by this process
+    try:
+        return orjson.dumps(data, default=_orjson_default, option=orjson.OPT_NON_STR_KEYS)
+    except orjson.JSONEncodeError as e:
+        # orjson refuses what stdlib json accepts (e.g. ints beyond 64 bits); fall back
+        # rather than lose the write, as _parse_db_bytes does on read
+        logger.warning(f"orjson could not serialize DB ({e}), falling back to stdlib json")
+    try:
+        return json.dumps(data, default=_orjson_default, separators=(",", ":")).encode("utf-8")
+    except Exception as e:
+        logger.error(f"Failed to serialize DB for file fallback: {e}")
+        return None
+
+def _write_db_file_bytes(payload: bytes) -> bool:
+    # Pure disk I/O; safe to run without _lock (writes are ordered by _write_lock).
+    global _DB_MTIME
     try:
         os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
     except Exception:
         pass
     tmp = DB_PATH + ".tmp"
     try:
-        with open(tmp, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+        with open(tmp, "wb") as f:
+            f.write(payload)
         os.replace(tmp, DB_PATH)
+        _DB_MTIME = _db_file_mtime()
+        return True
     except Exception as e:
         logger.warning(f"Atomic write failed ({e}), attempting fallback")
         try:
-            with open(DB_PATH, "w", encoding="utf-8") as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
+            with open(DB_PATH, "wb") as f:
+                f.write(payload)
+            _DB_MTIME = _db_file_mtime()
+            return True
         except Exception as e2:
             logger.error(f"Failed to write DB file fallback: {e2}")
+            return False
+
+async def _flush_db_file():
+    """
+    Persist _DB if dirty. _lock is held only while serializing the snapshot; the disk
+    write happens after it is released so requests never wait on file I/O.
+    """
+    global _dirty, _write_in_progress
+    async with _write_lock:
+        async with _lock:
+            if not _dirty or _DB is None or _DB_UNREADABLE:
+                return
+            payload = _dump_db_file(_DB)
+            if payload is None:
+                return  # stay dirty: dropping the flag would silently lose every later change
+            _dirty = False
+        _write_in_progress = True
+        write = asyncio.ensure_future(asyncio.to_thread(_write_db_file_bytes, payload))
+        try:
+            # cancelling us cannot stop the worker thread: shield it and keep _write_lock
+            # until it finishes, so no second writer races it on DB_PATH + ".tmp"
+            ok = await asyncio.shield(write)
+        except asyncio.CancelledError:
+            await asyncio.wait([write])
+            if not write.result():
+                _dirty = True
+            raise
+        finally:
+            _write_in_progress = False
+        if not ok:
+            _dirty = True  # retry on the next flush
 
 # ---------------------------
 # Postgres helpers and schema
@@ -151,7 +373,13 @@ def _pg_connect():
         logger.warning(f"Could not connect to Postgres: {e}")
         return None
 
+_schema_ready = False
+
 def _init_schema(conn):
+    # DDL is idempotent, so once it has succeeded in this process skip the round trips
+    global _schema_ready
+    if _schema_ready:
+        return
     with conn.cursor() as cur:
         # users
         cur.execute("""
@@ -203,7 +431,11 @@ def _init_schema(conn):
             closed_at TIMESTAMPTZ
         );
         """)
+        # leaderboard / podium read the top of users by balance, live-wins the newest trades
+        cur.execute("CREATE INDEX IF NOT EXISTS users_balance_idx ON users (balance DESC);")
+        cur.execute("CREATE INDEX IF NOT EXISTS recent_trades_ts_idx ON recent_trades (ts DESC);")
         conn.commit()
+    _schema_ready = True
 
 def _seed_db_to_postgres_if_empty(conn):
     """
@@ -217,8 +449,8 @@ def _seed_db_to_postgres_if_empty(conn):
         # Load seed
         if os.path.exists(SEED_DB_PATH):
             try:
-                with open(SEED_DB_PATH, "r", encoding="utf-8") as f:
-                    seed = json.load(f)
+                with open(SEED_DB_PATH, "rb") as f:
+                    seed = orjson.loads(f.read())
             except Exception as e:
                 logger.warning(f"Failed to load seed JSON for PG seeding: {e}")
                 seed = None
@@ -240,7 +472,7 @@ def _seed_db_to_postgres_if_empty(conn):
                             decimal.Decimal(str(u.get("period_start_balance", START_BALANCE)))
                         ))
                     # recent trades
-                    for rt in reversed(seed.get("recent_trades", [])[:500]):  # reversed so IDs increase in original order
+                    for rt in reversed(seed.get("recent_trades", [])[:MAX_RECENT_TRADES]):  # reversed so IDs increase in original order
                         cur.execute("""
                             INSERT INTO recent_trades (ts, username, nickname, result, amount)
                             VALUES (%s,%s,%s,%s,%s);
@@ -257,7 +489,7 @@ def _seed_db_to_postgres_if_empty(conn):
                             INSERT INTO monthly_winners (month, data, closed_at)
                             VALUES (%s, %s::jsonb, %s)
                             ON CONFLICT (month) DO NOTHING;
-                        """, (m, json.dumps(w), _iso_to_dt(w.get("closed_at"))))
+                        """, (m, orjson.dumps(w).decode(), _iso_to_dt(w.get("closed_at"))))
                     # auth users
                     auth = seed.get("auth", {}).get("users", {})
                     now = _now_ts()
@@ -328,7 +560,7 @@ def _get_user_pg(conn, username: str) -> Optional[Dict[str, Any]]:
         }
 
 
-def _upsert_user_pg(conn, username: str, user_obj: Dict[str, Any]):
+def _upsert_user_pg(conn, username: str, user_obj: Dict[str, Any], commit: bool = True):
     with conn.cursor() as cur:
         cur.execute("""
             INSERT INTO users (username,nickname,balance,last_update,trades,wins,period_start_balance)
@@ -349,6 +581,7 @@ def _upsert_user_pg(conn, username: str, user_obj: Dict[str, Any]):
             int(user_obj.get("wins", 0) or 0),
             decimal.Decimal(str(user_obj.get("period_start_balance", START_BALANCE)))
         ))
+    if commit:
         conn.commit()
 
 def _insert_recent_trade_pg(conn, entry: Dict[str, Any]):
@@ -363,10 +596,14 @@ def _insert_recent_trade_pg(conn, entry: Dict[str, Any]):
             entry.get("result"),
             decimal.Decimal(str(entry.get("amount", 0.0)))
         ))
-        conn.commit()
-        # trim to latest 500
-        cur.execute("DELETE FROM recent_trades WHERE id NOT IN (SELECT id FROM recent_trades ORDER BY ts DESC LIMIT 500);")
-        conn.commit()
+        # trim to the latest MAX_RECENT_TRADES: a single PK range delete (a no-op while
+        # the table is still short) instead of a NOT IN over the whole table
+        cur.execute(
+            "DELETE FROM recent_trades WHERE id < "
+            "(SELECT id FROM recent_trades ORDER BY id DESC OFFSET %s LIMIT 1);",
+            (MAX_RECENT_TRADES - 1,)
+        )
+    conn.commit()
 
 def _get_recent_trades_pg(conn, limit=100, minutes: Optional[int]=None, nickname: Optional[str]=None):
     with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
@@ -381,7 +618,8 @@ def _get_recent_trades_pg(conn, limit=100, minutes: Optional[int]=None, nickname
             params.append(nickname)
         if where:
             q += " WHERE " + " AND ".join(where)
-        q += " ORDER BY ts DESC LIMIT %s;"
+        # ts has second precision, so break ties by insertion order
+        q += " ORDER BY ts DESC, id DESC LIMIT %s;"
         params.append(limit)
         cur.execute(q, params)
         rows = cur.fetchall()
@@ -401,7 +639,7 @@ def _get_leaderboard_pg(conn, limit=100):
         cur.execute("""
             SELECT username,nickname,balance,trades,wins,period_start_balance,last_update
             FROM users
-            ORDER BY balance::numeric DESC
+            ORDER BY balance DESC
             LIMIT %s;
         """, (limit,))
         rows = cur.fetchall()
@@ -495,7 +733,7 @@ def _insert_monthly_winner_pg(conn, month: str, podium: List[Dict[str, Any]]):
             INSERT INTO monthly_winners (month, data, closed_at)
             VALUES (%s, %s::jsonb, %s)
             ON CONFLICT (month) DO UPDATE SET data = EXCLUDED.data, closed_at = EXCLUDED.closed_at;
-        """, (month, json.dumps({"podium": podium}), _now_ts()))
+        """, (month, orjson.dumps({"podium": podium}).decode(), _now_ts()))
         conn.commit()
 
 # ---------------------------
@@ -530,9 +768,16 @@ def _write_db(_data: Dict[str, Any]):
     With PG primary, writes are handled per-operation. For compatibility we keep a file copy.
     We'll write the full JSON file fallback if provided (best-effort).
     """
+    global _dirty
     if isinstance(_data, dict):
         try:
-            _write_db_file_fallback(_data)
+            if _data is not _DB:
+                _install_db(_data)
+            _mark_dirty()
+            if not _DB_UNREADABLE:
+                payload = _dump_db_file(_DB)
+                if payload is not None and _write_db_file_bytes(payload):
+                    _dirty = False
         except Exception:
             pass
     # If using PG, authoritative writes happen in per-endpoint PG functions.
@@ -562,10 +807,17 @@ def compute_user_metrics_from_record(user_record: Dict[str, Any]) -> Dict[str, A
         start = float(user_record.get("period_start_balance", START_BALANCE))
     except Exception:
         start = START_BALANCE
+    # same fallback _board_update ranks by, so a stored record and its leaderboard row agree
+    if not math.isfinite(balance):
+        balance = START_BALANCE
+    if not math.isfinite(start):
+        start = START_BALANCE
     if start == 0:
         performance = 0.0
     else:
         performance = ((balance - start) / start) * 100.0
+        if not math.isfinite(performance):
+            performance = 0.0  # extreme balances can overflow the ratio
     trades = int(user_record.get("trades", 0) or 0)
     wins = int(user_record.get("wins", 0) or 0)
     if trades <= 0:
@@ -581,6 +833,29 @@ def compute_user_metrics_from_record(user_record: Dict[str, Any]) -> Dict[str, A
         "balance": round(balance, 2)
     }
 
+def _trade_balance(balance: Any, res: str, amt: float) -> float:
+    # Balance after a win/lose of `amt`; refuse results that overflow to inf before
+    # anything is stored (orjson would serialize them as null).
+    new_balance = round(float(balance) + amt if res == "win" else float(balance) - amt, 2)
+    if not math.isfinite(new_balance):
+        raise HTTPException(status_code=400, detail="amount would overflow the balance")
+    return new_balance
+
+def _recompute(u: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Store performance/win_rate (and the normalized balances) on a cached (file fallback)
+    user record so reads don't recompute them. Call after any mutation of that user;
+    returns the full metrics.
+    """
+    metrics = compute_user_metrics_from_record(u)
+    u["balance"] = metrics["balance"]
+    u["period_start_balance"] = metrics["period_start_balance"]
+    u["trades"] = metrics["trades_this_period"]
+    u["wins"] = metrics["wins"]
+    u["performance"] = metrics["performance"]
+    u["win_rate"] = metrics["win_rate"]
+    return metrics
+
 # ---------------------------
 # Simple password hashing
 # ---------------------------
@@ -598,7 +873,7 @@ def generate_token() -> str:
     return secrets.token_urlsafe(32)
 
 # ---------------------------
-# Pydantic models
+# Request body models
 # ---------------------------
 class RegisterBody(BaseModel):
     username: str
@@ -609,22 +884,144 @@ class LoginBody(BaseModel):
     username: str
     password: str
 
-class UserUpdate(BaseModel):
-    nickname: Optional[str] = None
-    balance: Optional[float] = None
-    trades: Optional[int] = None
-    wins: Optional[int] = None
-    period_start_balance: Optional[float] = None
-
-class TradeRecord(BaseModel):
-    result: str = Field(..., description='Either "win" or "lose"')
-    amount: Optional[float] = None
-    nickname: Optional[str] = None
+# The hot POST bodies below are plain TypedDicts parsed by hand instead of Pydantic
+# models. The parsers enforce the same types the models did (400 instead of 422), so
+# handlers only ever see None or a value of the declared type.
+class UserUpdate(TypedDict, total=False):
+    nickname: Optional[str]
+    balance: Optional[float]
+    trades: Optional[int]
+    wins: Optional[int]
+    period_start_balance: Optional[float]
+
+class TradeRecord(TypedDict, total=False):
+    result: str  # "win" or "lose"
+    amount: Optional[float]
+    nickname: Optional[str]
+
+_INT64_MIN, _INT64_MAX = -(2 ** 63), 2 ** 63 - 1  # what orjson (and a PG bigint) can hold
+
+def _bad_field(field: str, expected: str):
+    raise HTTPException(status_code=400, detail=f"{field} must be {expected}")
+
+def _opt_str(data: Dict[str, Any], field: str) -> Optional[str]:
+    v = data.get(field)
+    if v is not None and not isinstance(v, str):
+        _bad_field(field, "a string")
+    return v
+
+def _opt_float(data: Dict[str, Any], field: str) -> Optional[float]:
+    v = data.get(field)
+    if v is None:
+        return None
+    # bool is an int subclass; Pydantic rejected it for floats too
+    if isinstance(v, bool) or not isinstance(v, (int, float, str)):
+        _bad_field(field, "a number")
+    try:
+        number = float(v)
+    except (ValueError, OverflowError):
+        _bad_field(field, "a number")
+    # float("nan") / float("inf") parse fine but poison balances and the leaderboard ordering
+    if not math.isfinite(number):
+        _bad_field(field, "a finite number")
+    return number
+
+def _opt_int(data: Dict[str, Any], field: str) -> Optional[int]:
+    v = data.get(field)
+    if v is None:
+        return None
+    if isinstance(v, bool):
+        _bad_field(field, "an integer")
+    if isinstance(v, int):
+        number = v
+    elif isinstance(v, float) and v.is_integer():
+        number = int(v)
+    elif isinstance(v, str):
+        try:
+            number = int(v.strip())
+        except ValueError:
+            _bad_field(field, "an integer")
+    else:
+        _bad_field(field, "an integer")
+    if not _INT64_MIN <= number <= _INT64_MAX:
+        _bad_field(field, "a 64-bit integer")
+    return number
+
+async def _read_json_object(request: Request) -> Dict[str, Any]:
+    try:
+        data = orjson.loads(await request.body())
+    except orjson.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="invalid JSON body")
+    if not isinstance(data, dict):
+        raise HTTPException(status_code=400, detail="JSON object body required")
+    return data
+
+async def _parse_trade_record(request: Request) -> TradeRecord:
+    data = await _read_json_object(request)
+    result = data.get("result")
+    if not isinstance(result, str):
+        _bad_field("result", "a string")
+    return TradeRecord(
+        result=result,
+        amount=_opt_float(data, "amount"),
+        nickname=_opt_str(data, "nickname"),
+    )
+
+async def _parse_user_update(request: Request) -> UserUpdate:
+    data = await _read_json_object(request)
+    return UserUpdate(
+        nickname=_opt_str(data, "nickname"),
+        balance=_opt_float(data, "balance"),
+        trades=_opt_int(data, "trades"),
+        wins=_opt_int(data, "wins"),
+        period_start_balance=_opt_float(data, "period_start_balance"),
+    )
+
+def _json_body_doc(properties: Dict[str, Any], required: Optional[List[str]] = None) -> Dict[str, Any]:
+    # openapi_extra for the hand-parsed bodies, which FastAPI cannot introspect
+    schema = {"type": "object", "properties": properties}
+    if required:
+        schema["required"] = required
+    return {"requestBody": {"required": True, "content": {"application/json": {"schema": schema}}}}
+
+_NUMBER = {"anyOf": [{"type": "number"}, {"type": "string"}, {"type": "null"}]}
+_INTEGER = {"anyOf": [{"type": "integer"}, {"type": "string"}, {"type": "null"}]}
+_NICKNAME = {"anyOf": [{"type": "string"}, {"type": "null"}]}
+
+TRADE_RECORD_DOC = _json_body_doc({
+    "result": {"type": "string", "description": 'Either "win" or "lose"'},
+    "amount": _NUMBER,
+    "nickname": _NICKNAME,
+}, required=["result"])
+
+USER_UPDATE_DOC = _json_body_doc({
+    "nickname": _NICKNAME,
+    "balance": _NUMBER,
+    "trades": _INTEGER,
+    "wins": _INTEGER,
+    "period_start_balance": _NUMBER,
+})
 
 # ---------------------------
 # FastAPI app & endpoints
 # ---------------------------
-app = FastAPI(title="Kenzies Fridge Leaderboard API (Postgres primary)")
+class ORJSONResponse(JSONResponse):
+    """
+    JSONResponse rendered with orjson instead of the stdlib encoder.
+    API handlers return it directly (and declare no response_model): FastAPI runs
+    jsonable_encoder over any plain dict a handler returns, but passes a Response through.
+    """
+    def render(self, content: Any) -> bytes:
+        try:
+            return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+        except orjson.JSONEncodeError:
+            # e.g. ints beyond 64 bits, which the stdlib encoder still handles
+            return super().render(content)
+
+app = FastAPI(
+    title="Kenzies Fridge Leaderboard API (Postgres primary)",
+    default_response_class=ORJSONResponse,
+)
 
 app.add_middleware(
     CORSMiddleware,
@@ -633,6 +1030,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# leaderboard / live-wins payloads are large and highly repetitive JSON
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
 
 app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
 
@@ -644,7 +1043,7 @@ def root_index():
     return JSONResponse({"message": "Kenzies Fridge API - static index not found"}, status_code=200)
 
 @app.on_event("startup")
-def startup_info():
+async def startup_info():
     index_path = os.path.join(STATIC_DIR, "index.html")
     logger.info(f"Starting Kenzies Fridge API (Postgres primary, file fallback)")
     logger.info(f"STATIC_DIR = {os.path.abspath(STATIC_DIR)}")
@@ -655,10 +1054,30 @@ def startup_info():
     except Exception as e:
         logger.info(f"Could not list static dir: {e}")
     # Ensure DB exists; if missing, _read_db will seed fallback or PG
-    with _lock:
-        db = _read_db()
+    async with _lock:
+        db = await asyncio.to_thread(_read_db)
         # If PG connected, we attempted seeding in _read_db; also push file seed to PG if needed (handled there)
 
+async def _flush_db_periodically():
+    while True:
+        await asyncio.sleep(FLUSH_INTERVAL_SECONDS)
+        await _flush_db_file()
+
+@app.on_event("startup")
+async def start_db_flusher():
+    global _flush_task
+    if not USE_PG:
+        _flush_task = asyncio.create_task(_flush_db_periodically())
+
+@app.on_event("shutdown")
+async def flush_db_on_shutdown():
+    if _flush_task is not None:
+        _flush_task.cancel()
+        # let an in-flight write finish before the final flush
+        with contextlib.suppress(asyncio.CancelledError):
+            await _flush_task
+    await _flush_db_file()
+
 @app.get("/_debug/static-files")
 def debug_static_files():
     index_path = os.path.join(STATIC_DIR, "index.html")
@@ -717,33 +1136,37 @@ def _cleanup_expired_sessions_db(db_conn=None, fallback_db=None):
             for t in to_del:
                 sess.pop(t, None)
 
-def _get_db_and_user_from_token(authorization: Optional[str]) -> Optional[str]:
+def _get_session_username_from_pg(token: str) -> Optional[str]:
+    conn = _pg_connect()
+    if not conn:
+        return None
+    try:
+        _cleanup_expired_sessions_pg(conn)
+        username = _get_session_username_pg(conn, token)
+        return username
+    finally:
+        conn.close()
+
+async def _get_db_and_user_from_token(authorization: Optional[str]) -> Optional[str]:
     if not authorization:
         return None
     if not authorization.lower().startswith("bearer "):
         return None
     token = authorization.split(" ", 1)[1].strip()
     if USE_PG:
-        conn = _pg_connect()
-        if not conn:
-            return None
-        try:
-            _cleanup_expired_sessions_pg(conn)
-            username = _get_session_username_pg(conn, token)
-            return username
-        finally:
-            conn.close()
+        return await asyncio.to_thread(_get_session_username_from_pg, token)
     else:
-        db = _read_db_file_fallback()
-        _cleanup_expired_sessions_db(None, db)
-        sess = db.get("auth", {}).get("sessions", {})
-        info = sess.get(token)
-        if not info:
-            return None
-        return info.get("username")
+        async with _lock:
+            db = _read_db_file_fallback()
+            _cleanup_expired_sessions_db(None, db)
+            sess = db.get("auth", {}).get("sessions", {})
+            info = sess.get(token)
+            if not info:
+                return None
+            return info.get("username")
 
 async def get_current_username(authorization: Optional[str] = Header(None)):
-    username = _get_db_and_user_from_token(authorization)
+    username = await _get_db_and_user_from_token(authorization)
     if not username:
         raise HTTPException(status_code=401, detail="Invalid or missing token")
     return username
@@ -751,49 +1174,53 @@ async def get_current_username(authorization: Optional[str] = Header(None)):
 # ---------------------------
 # Register / Login endpoints (PG primary)
 # ---------------------------
+def _pg_register(body: RegisterBody, username: str, password: str):
+    conn = _pg_connect()
+    if not conn:
+        raise HTTPException(status_code=500, detail="Postgres connection failed")
+    try:
+        _init_schema(conn)
+        existing = _get_auth_user_pg(conn, username)
+        if existing:
+            raise HTTPException(status_code=409, detail="username already exists")
+        au = _create_auth_user(username, password, body.nickname)
+        _create_auth_user_pg(conn, username, au["salt"], au["passhash"], au.get("nickname"))
+        # create users row
+        user_obj = {
+            "nickname": body.nickname or username,
+            "balance": START_BALANCE,
+            "last_update": _now_iso(),
+            "trades": 0,
+            "wins": 0,
+            "period_start_balance": START_BALANCE
+        }
+        _upsert_user_pg(conn, username, user_obj)
+        token = _create_session_for_user_pg(conn, username)
+        return {"status": "ok", "username": username, "token": token, "message": "registered and logged in"}
+    finally:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
 @app.post("/api/register")
-def register(body: RegisterBody):
+async def register(body: RegisterBody):
     username = (body.username or "").strip()
     if not username:
         raise HTTPException(status_code=400, detail="username required")
     password = (body.password or "")
     if not password or len(password) < 6:
         raise HTTPException(status_code=400, detail="password required (min 6 chars)")
-    with _lock:
+    async with _lock:
         if USE_PG:
-            conn = _pg_connect()
-            if not conn:
-                raise HTTPException(status_code=500, detail="Postgres connection failed")
-            try:
-                _init_schema(conn)
-                existing = _get_auth_user_pg(conn, username)
-                if existing:
-                    raise HTTPException(status_code=409, detail="username already exists")
-                au = _create_auth_user(username, password, body.nickname)
-                _create_auth_user_pg(conn, username, au["salt"], au["passhash"], au.get("nickname"))
-                # create users row
-                user_obj = {
-                    "nickname": body.nickname or username,
-                    "balance": START_BALANCE,
-                    "last_update": _now_iso(),
-                    "trades": 0,
-                    "wins": 0,
-                    "period_start_balance": START_BALANCE
-                }
-                _upsert_user_pg(conn, username, user_obj)
-                token = _create_session_for_user_pg(conn, username)
-                return {"status": "ok", "username": username, "token": token, "message": "registered and logged in"}
-            finally:
-                try:
-                    conn.close()
-                except Exception:
-                    pass
+            return ORJSONResponse(await asyncio.to_thread(_pg_register, body, username, password))
         else:
             db = _read_db_file_fallback()
             auth_users = db.setdefault("auth", {}).setdefault("users", {})
             if username in auth_users:
                 raise HTTPException(status_code=409, detail="username already exists")
-            auth_users[username] = _create_auth_user(username, password, body.nickname)
+            # PBKDF2 is CPU-bound; keep it off the event loop
+            auth_users[username] = await asyncio.to_thread(_create_auth_user, username, password, body.nickname)
             users = db.setdefault("users", {})
             if username not in users:
                 users[username] = {
@@ -804,6 +1231,8 @@ def register(body: RegisterBody):
                     "wins": 0,
                     "period_start_balance": START_BALANCE
                 }
+                _recompute(users[username])
+                _board_update(username, users[username])
             # create session
             token = generate_token()
             now_ts = int(time.time())
@@ -813,38 +1242,41 @@ def register(body: RegisterBody):
                 "created_at": _now_iso(),
                 "expires_at": datetime.utcfromtimestamp(expires_ts).isoformat() + "Z"
             }
-            _write_db_file_fallback(db)
-            return {"status": "ok", "username": username, "token": token, "message": "registered and logged in"}
+            _mark_dirty()
+            return ORJSONResponse({"status": "ok", "username": username, "token": token, "message": "registered and logged in"})
+
+def _pg_login(username: str, password: str):
+    conn = _pg_connect()
+    if not conn:
+        raise HTTPException(status_code=500, detail="Postgres connection failed")
+    try:
+        _init_schema(conn)
+        user = _get_auth_user_pg(conn, username)
+        if not user:
+            raise HTTPException(status_code=401, detail="invalid credentials")
+        salt = user.get("salt")
+        ph = user.get("passhash")
+        if not verify_password(password, salt, ph):
+            raise HTTPException(status_code=401, detail="invalid credentials")
+        token = generate_token()
+        expires_dt = datetime.utcfromtimestamp(int(time.time()) + SESSION_TTL_SECONDS).replace(tzinfo=timezone.utc)
+        _create_session_pg(conn, token, username, expires_dt)
+        return {"status": "ok", "token": token, "username": username, "expires_in": SESSION_TTL_SECONDS}
+    finally:
+        try:
+            conn.close()
+        except Exception:
+            pass
 
 @app.post("/api/login")
-def login(body: LoginBody):
+async def login(body: LoginBody):
     username = (body.username or "").strip()
     password = (body.password or "")
     if not username or not password:
         raise HTTPException(status_code=400, detail="username and password required")
-    with _lock:
+    async with _lock:
         if USE_PG:
-            conn = _pg_connect()
-            if not conn:
-                raise HTTPException(status_code=500, detail="Postgres connection failed")
-            try:
-                _init_schema(conn)
-                user = _get_auth_user_pg(conn, username)
-                if not user:
-                    raise HTTPException(status_code=401, detail="invalid credentials")
-                salt = user.get("salt")
-                ph = user.get("passhash")
-                if not verify_password(password, salt, ph):
-                    raise HTTPException(status_code=401, detail="invalid credentials")
-                token = generate_token()
-                expires_dt = datetime.utcfromtimestamp(int(time.time()) + SESSION_TTL_SECONDS).replace(tzinfo=timezone.utc)
-                _create_session_pg(conn, token, username, expires_dt)
-                return {"status": "ok", "token": token, "username": username, "expires_in": SESSION_TTL_SECONDS}
-            finally:
-                try:
-                    conn.close()
-                except Exception:
-                    pass
+            return ORJSONResponse(await asyncio.to_thread(_pg_login, username, password))
         else:
             db = _read_db_file_fallback()
             auth_users = db.setdefault("auth", {}).setdefault("users", {})
@@ -853,7 +1285,7 @@ def login(body: LoginBody):
                 raise HTTPException(status_code=401, detail="invalid credentials")
             salt = user.get("salt")
             ph = user.get("passhash")
-            if not verify_password(password, salt, ph):
+            if not await asyncio.to_thread(verify_password, password, salt, ph):
                 raise HTTPException(status_code=401, detail="invalid credentials")
             token = generate_token()
             now_ts = int(time.time())
@@ -863,134 +1295,152 @@ def login(body: LoginBody):
                 "created_at": _now_iso(),
                 "expires_at": datetime.utcfromtimestamp(expires_ts).isoformat() + "Z"
             }
-            _write_db_file_fallback(db)
-            return {"status": "ok", "token": token, "username": username, "expires_in": SESSION_TTL_SECONDS}
+            _mark_dirty()
+            return ORJSONResponse({"status": "ok", "token": token, "username": username, "expires_in": SESSION_TTL_SECONDS})
+
+def _pg_logout(token: str):
+    conn = _pg_connect()
+    if not conn:
+        raise HTTPException(status_code=500, detail="Postgres connection failed")
+    try:
+        with conn.cursor() as cur:
+            cur.execute("DELETE FROM sessions WHERE token=%s;", (token,))
+            conn.commit()
+            return {"status": "ok", "message": "logged out"}
+    finally:
+        try:
+            conn.close()
+        except Exception:
+            pass
 
 @app.post("/api/logout")
-def logout(authorization: Optional[str] = Header(None)):
+async def logout(authorization: Optional[str] = Header(None)):
     if not authorization or not authorization.lower().startswith("bearer "):
         raise HTTPException(status_code=401, detail="missing token")
     token = authorization.split(" ", 1)[1].strip()
-    with _lock:
+    async with _lock:
         if USE_PG:
-            conn = _pg_connect()
-            if not conn:
-                raise HTTPException(status_code=500, detail="Postgres connection failed")
-            try:
-                with conn.cursor() as cur:
-                    cur.execute("DELETE FROM sessions WHERE token=%s;", (token,))
-                    conn.commit()
-                    return {"status": "ok", "message": "logged out"}
-            finally:
-                try:
-                    conn.close()
-                except Exception:
-                    pass
+            return ORJSONResponse(await asyncio.to_thread(_pg_logout, token))
         else:
             db = _read_db_file_fallback()
             sess = db.setdefault("auth", {}).setdefault("sessions", {})
             if token in sess:
                 del sess[token]
-                _write_db_file_fallback(db)
-                return {"status": "ok", "message": "logged out"}
+                _mark_dirty()
+                return ORJSONResponse({"status": "ok", "message": "logged out"})
             raise HTTPException(status_code=401, detail="invalid token")
 
 # ---------------------------
 # User endpoints (PG primary)
 # ---------------------------
-@app.post("/api/user/me/trade")
-def record_trade_me(tr: TradeRecord, username: str = Depends(get_current_username)):
-    user_key = username
-    with _lock:
-        if USE_PG:
-            conn = _pg_connect()
-            if not conn:
-                raise HTTPException(status_code=500, detail="Postgres connection failed")
+def _pg_record_trade_me(tr: TradeRecord, user_key: str):
+    conn = _pg_connect()
+    if not conn:
+        raise HTTPException(status_code=500, detail="Postgres connection failed")
+    try:
+        _init_schema(conn)
+        # fetch or create user row
+        cur_user = _get_user_pg(conn, user_key)
+        if not cur_user:
+            cur_user = {
+                "nickname": "",
+                "balance": START_BALANCE,
+                "last_update": None,
+                "trades": 0,
+                "wins": 0,
+                "period_start_balance": START_BALANCE
+            }
+        changed_nick = None
+        if tr.get("nickname") is not None:
+            n = (tr.get("nickname") or "").strip()[:40]
+            if n != cur_user.get("nickname", ""):
+                changed_nick = n
+                cur_user["nickname"] = n
+        cur_user.setdefault("trades", 0)
+        cur_user.setdefault("wins", 0)
+        cur_user.setdefault("period_start_balance", START_BALANCE)
+        cur_user.setdefault("balance", START_BALANCE)
+        res = (tr.get("result") or "").lower()
+        if res not in ("win", "lose"):
+            raise HTTPException(status_code=400, detail='result must be "win" or "lose"')
+        cur_user["trades"] = int(cur_user.get("trades", 0)) + 1
+        if res == "win":
+            cur_user["wins"] = int(cur_user.get("wins", 0)) + 1
+        amt = 0.0
+        if tr.get("amount") is not None:
             try:
-                _init_schema(conn)
-                # fetch or create user row
-                cur_user = _get_user_pg(conn, user_key)
-                if not cur_user:
-                    cur_user = {
-                        "nickname": "",
-                        "balance": START_BALANCE,
-                        "last_update": None,
-                        "trades": 0,
-                        "wins": 0,
-                        "period_start_balance": START_BALANCE
-                    }
-                changed_nick = None
-                if tr.nickname is not None:
-                    n = (tr.nickname or "").strip()[:40]
-                    if n != cur_user.get("nickname", ""):
-                        changed_nick = n
-                        cur_user["nickname"] = n
-                cur_user.setdefault("trades", 0)
-                cur_user.setdefault("wins", 0)
-                cur_user.setdefault("period_start_balance", START_BALANCE)
-                cur_user.setdefault("balance", START_BALANCE)
-                res = (tr.result or "").lower()
-                if res not in ("win", "lose"):
-                    raise HTTPException(status_code=400, detail='result must be "win" or "lose"')
-                cur_user["trades"] = int(cur_user.get("trades", 0)) + 1
-                if res == "win":
-                    cur_user["wins"] = int(cur_user.get("wins", 0)) + 1
+                amt = float(tr.get("amount"))
+            except Exception:
                 amt = 0.0
-                if tr.amount is not None:
-                    try:
-                        amt = float(tr.amount)
-                    except Exception:
-                        amt = 0.0
-                # IMPORTANT: apply the balance change and persist to PG via _upsert_user_pg
-                if tr.amount is not None:
-                    if res == "win":
-                        cur_user["balance"] = round(float(cur_user.get("balance", START_BALANCE)) + amt, 2)
-                    else:
-                        # subtract on loss — this updates the authoritative PG value and thus the leaderboard ordering
-                        cur_user["balance"] = round(float(cur_user.get("balance", START_BALANCE)) - amt, 2)
-                cur_user["last_update"] = _now_iso()
-                # upsert user (authoritative write to PG)
-                _upsert_user_pg(conn, user_key, cur_user)
-                # update recent_trades
-                trade_entry = {
-                    "ts": cur_user["last_update"],
-                    "username": user_key,
-                    "nickname": cur_user.get("nickname", "") or "",
-                    "result": res,
-                    "amount": round(amt, 2)
-                }
-                _insert_recent_trade_pg(conn, trade_entry)
-                metrics = compute_user_metrics_from_record({
-                    "balance": cur_user["balance"],
-                    "period_start_balance": cur_user.get("period_start_balance", START_BALANCE),
-                    "trades": cur_user.get("trades", 0),
-                    "wins": cur_user.get("wins", 0)
-                })
-                resp = {
-                    "status": "ok",
-                    "user": {
-                        "username": user_key,
-                        "nickname": cur_user.get("nickname", "") or "",
-                        "balance": metrics["balance"],
-                        "performance": metrics["performance"],
-                        "win_rate": metrics["win_rate"],
-                        "trades_this_period": metrics["trades_this_period"],
-                        "wins": metrics["wins"],
-                        "period_start_balance": metrics["period_start_balance"],
-                        "last_update": cur_user.get("last_update")
-                    }
-                }
-                if changed_nick:
-                    resp["message"] = f"nickname set to {changed_nick}"
-                return resp
-            finally:
-                try:
-                    conn.close()
-                except Exception:
-                    pass
+        # IMPORTANT: apply the balance change and persist to PG via _upsert_user_pg
+        # (a loss subtracts — this updates the authoritative PG value and thus the leaderboard ordering)
+        if tr.get("amount") is not None:
+            cur_user["balance"] = _trade_balance(cur_user.get("balance", START_BALANCE), res, amt)
+        cur_user["last_update"] = _now_iso()
+        # upsert user (authoritative write to PG); committed together with the trade row
+        _upsert_user_pg(conn, user_key, cur_user, commit=False)
+        # update recent_trades
+        trade_entry = {
+            "ts": cur_user["last_update"],
+            "username": user_key,
+            "nickname": cur_user.get("nickname", "") or "",
+            "result": res,
+            "amount": round(amt, 2)
+        }
+        _insert_recent_trade_pg(conn, trade_entry)
+        metrics = compute_user_metrics_from_record({
+            "balance": cur_user["balance"],
+            "period_start_balance": cur_user.get("period_start_balance", START_BALANCE),
+            "trades": cur_user.get("trades", 0),
+            "wins": cur_user.get("wins", 0)
+        })
+        resp = {
+            "status": "ok",
+            "user": {
+                "username": user_key,
+                "nickname": cur_user.get("nickname", "") or "",
+                "balance": metrics["balance"],
+                "performance": metrics["performance"],
+                "win_rate": metrics["win_rate"],
+                "trades_this_period": metrics["trades_this_period"],
+                "wins": metrics["wins"],
+                "period_start_balance": metrics["period_start_balance"],
+                "last_update": cur_user.get("last_update")
+            }
+        }
+        if changed_nick:
+            resp["message"] = f"nickname set to {changed_nick}"
+        return resp
+    finally:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+@app.post("/api/user/me/trade", openapi_extra=TRADE_RECORD_DOC)
+async def record_trade_me(request: Request, username: str = Depends(get_current_username)):
+    tr = await _parse_trade_record(request)
+    user_key = username
+    async with _lock:
+        if USE_PG:
+            return ORJSONResponse(await asyncio.to_thread(_pg_record_trade_me, tr, user_key))
         else:
+            # validate before touching the cached DB so a rejected trade leaves no partial update
+            res = (tr.get("result") or "").lower()
+            if res not in ("win", "lose"):
+                raise HTTPException(status_code=400, detail='result must be "win" or "lose"')
             db = _read_db_file_fallback()
             users = db.setdefault("users", {})
+            amt = 0.0
+            if tr.get("amount") is not None:
+                try:
+                    amt = float(tr.get("amount"))
+                except Exception:
+                    amt = 0.0
+            new_balance = None
+            if tr.get("amount") is not None:
+                prev = users.get(user_key) or {}
+                new_balance = _trade_balance(prev.get("balance", START_BALANCE), res, amt)
             u = users.setdefault(user_key, {
                 "nickname": "",
                 "balance": START_BALANCE,
@@ -1000,54 +1450,35 @@ def record_trade_me(tr: TradeRecord, username: str = Depends(get_current_usernam
                 "period_start_balance": START_BALANCE
             })
             changed_nick = None
-            if tr.nickname is not None:
-                n = (tr.nickname or "").strip()[:40]
+            if tr.get("nickname") is not None:
+                n = (tr.get("nickname") or "").strip()[:40]
                 if n != u.get("nickname", ""):
                     changed_nick = n
                     u["nickname"] = n
-                    recent = db.setdefault("recent_trades", [])
-                    for ent in recent:
-                        try:
-                            if ent.get("username") == user_key:
-                                ent["nickname"] = changed_nick
-                        except Exception:
-                            pass
+                    for ent in _recent_by_user.get(user_key, ()):
+                        ent["nickname"] = changed_nick
             u.setdefault("trades", 0)
             u.setdefault("wins", 0)
             u.setdefault("period_start_balance", START_BALANCE)
             u.setdefault("balance", START_BALANCE)
-            res = (tr.result or "").lower()
-            if res not in ("win", "lose"):
-                raise HTTPException(status_code=400, detail='result must be "win" or "lose"')
             u["trades"] = int(u.get("trades", 0)) + 1
             if res == "win":
                 u["wins"] = int(u.get("wins", 0)) + 1
-            amt = 0.0
-            if tr.amount is not None:
-                try:
-                    amt = float(tr.amount)
-                except Exception:
-                    amt = 0.0
-            if tr.amount is not None:
-                if res == "win":
-                    u["balance"] = round(float(u.get("balance", START_BALANCE)) + amt, 2)
-                else:
-                    u["balance"] = round(float(u.get("balance", START_BALANCE)) - amt, 2)
+            if new_balance is not None:
+                u["balance"] = new_balance
             u["last_update"] = _now_iso()
+            metrics = _recompute(u)
+            _board_update(user_key, u)
             trade_entry = {
                 "ts": u["last_update"],
+                "ts_epoch": int(time.time()),  # lets live-wins filter by int compare
                 "username": user_key,
                 "nickname": u.get("nickname", "") or "",
                 "result": res,
                 "amount": round(amt, 2)
             }
-            recent = db.setdefault("recent_trades", [])
-            recent.insert(0, trade_entry)
-            MAX_RECENT_TRADES = 500
-            if len(recent) > MAX_RECENT_TRADES:
-                del recent[MAX_RECENT_TRADES:]
-            _write_db_file_fallback(db)
-            metrics = compute_user_metrics_from_record(u)
+            _recent_add(db, trade_entry)
+            _mark_dirty()
             resp = {
                 "status": "ok",
                 "user": {
@@ -1064,106 +1495,101 @@ def record_trade_me(tr: TradeRecord, username: str = Depends(get_current_usernam
             }
             if changed_nick:
                 resp["message"] = f"nickname set to {changed_nick}"
-            return resp
+            return ORJSONResponse(resp)
+
+def _pg_get_leaderboard(limit: int):
+    conn = _pg_connect()
+    if not conn:
+        raise HTTPException(status_code=500, detail="Postgres connection failed")
+    try:
+        arr = _get_leaderboard_pg(conn, limit)
+        return {"leaderboard": arr, "timestamp": _now_iso()}
+    finally:
+        try:
+            conn.close()
+        except Exception:
+            pass
 
 @app.get("/api/leaderboard")
-def get_leaderboard(limit: int = 100):
+async def get_leaderboard(limit: int = 100):
     limit = max(0, min(limit, 1000))
-    with _lock:
+    async with _lock:
         if USE_PG:
-            conn = _pg_connect()
-            if not conn:
-                raise HTTPException(status_code=500, detail="Postgres connection failed")
-            try:
-                arr = _get_leaderboard_pg(conn, limit)
-                return {"leaderboard": arr, "timestamp": _now_iso()}
-            finally:
-                try:
-                    conn.close()
-                except Exception:
-                    pass
+            return ORJSONResponse(await asyncio.to_thread(_pg_get_leaderboard, limit))
         else:
-            db = _read_db_file_fallback()
-            users = db.get("users", {})
-            arr = []
-            for uname, u in users.items():
-                metrics = compute_user_metrics_from_record(u)
-                arr.append({
-                    "username": uname,
-                    "nickname": u.get("nickname", "") or "",
-                    "balance": metrics["balance"],
-                    "performance": metrics["performance"],
-                    "win_rate": metrics["win_rate"],
-                    "trades_this_period": metrics["trades_this_period"]
-                })
-            arr.sort(key=lambda x: x["balance"], reverse=True)
-            return {"leaderboard": arr[:limit], "timestamp": _now_iso()}
+            _read_db_file_fallback()
+            # the index already holds each user's response row; just take the top `limit`
+            arr = [row for _, _, row in _leaderboard.islice(0, limit)]
+            return ORJSONResponse({"leaderboard": arr, "timestamp": _now_iso()})
+
+def _pg_get_user_me(username: str):
+    conn = _pg_connect()
+    if not conn:
+        raise HTTPException(status_code=500, detail="Postgres connection failed")
+    try:
+        row = None
+        with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+            cur.execute("SELECT username,nickname,balance,last_update,trades,wins,period_start_balance FROM users WHERE username=%s;", (username,))
+            row = cur.fetchone()
+        if row:
+            metrics = compute_user_metrics_from_record({
+                "balance": float(row.get("balance")) if row.get("balance") is not None else START_BALANCE,
+                "period_start_balance": float(row.get("period_start_balance")) if row.get("period_start_balance") is not None else START_BALANCE,
+                "trades": int(row.get("trades") or 0),
+                "wins": int(row.get("wins") or 0)
+            })
+            return {
+                "username": username,
+                "nickname": row.get("nickname") or "",
+                "balance": metrics["balance"],
+                "performance": metrics["performance"],
+                "win_rate": metrics["win_rate"],
+                "trades_this_period": metrics["trades_this_period"],
+                "wins": metrics["wins"],
+                "period_start_balance": metrics["period_start_balance"],
+                "last_update": (row.get("last_update").isoformat()+"Z") if row.get("last_update") else None
+            }
+        else:
+            return {
+                "username": username,
+                "nickname": "",
+                "balance": round(START_BALANCE, 2),
+                "performance": 0.0,
+                "win_rate": 0.0,
+                "trades_this_period": 0,
+                "wins": 0,
+                "period_start_balance": round(START_BALANCE, 2),
+                "last_update": None
+            }
+    finally:
+        try:
+            conn.close()
+        except Exception:
+            pass
 
 @app.get("/api/user/me")
-def get_user_me(username: str = Depends(get_current_username)):
-    with _lock:
+async def get_user_me(username: str = Depends(get_current_username)):
+    async with _lock:
         if USE_PG:
-            conn = _pg_connect()
-            if not conn:
-                raise HTTPException(status_code=500, detail="Postgres connection failed")
-            try:
-                row = None
-                with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
-                    cur.execute("SELECT username,nickname,balance,last_update,trades,wins,period_start_balance FROM users WHERE username=%s;", (username,))
-                    row = cur.fetchone()
-                if row:
-                    metrics = compute_user_metrics_from_record({
-                        "balance": float(row.get("balance")) if row.get("balance") is not None else START_BALANCE,
-                        "period_start_balance": float(row.get("period_start_balance")) if row.get("period_start_balance") is not None else START_BALANCE,
-                        "trades": int(row.get("trades") or 0),
-                        "wins": int(row.get("wins") or 0)
-                    })
-                    return {
-                        "username": username,
-                        "nickname": row.get("nickname") or "",
-                        "balance": metrics["balance"],
-                        "performance": metrics["performance"],
-                        "win_rate": metrics["win_rate"],
-                        "trades_this_period": metrics["trades_this_period"],
-                        "wins": metrics["wins"],
-                        "period_start_balance": metrics["period_start_balance"],
-                        "last_update": (row.get("last_update").isoformat()+"Z") if row.get("last_update") else None
-                    }
-                else:
-                    return {
-                        "username": username,
-                        "nickname": "",
-                        "balance": round(START_BALANCE, 2),
-                        "performance": 0.0,
-                        "win_rate": 0.0,
-                        "trades_this_period": 0,
-                        "wins": 0,
-                        "period_start_balance": round(START_BALANCE, 2),
-                        "last_update": None
-                    }
-            finally:
-                try:
-                    conn.close()
-                except Exception:
-                    pass
+            return ORJSONResponse(await asyncio.to_thread(_pg_get_user_me, username))
         else:
             db = _read_db_file_fallback()
             user = db.get("users", {}).get(username)
             if user:
-                metrics = compute_user_metrics_from_record(user)
-                return {
+                # every cached user went through _recompute on load / last mutation
+                return ORJSONResponse({
                     "username": username,
                     "nickname": user.get("nickname", "") or "",
-                    "balance": metrics["balance"],
-                    "performance": metrics["performance"],
-                    "win_rate": metrics["win_rate"],
-                    "trades_this_period": metrics["trades_this_period"],
-                    "wins": metrics["wins"],
-                    "period_start_balance": metrics["period_start_balance"],
+                    "balance": user["balance"],
+                    "performance": user["performance"],
+                    "win_rate": user["win_rate"],
+                    "trades_this_period": user["trades"],
+                    "wins": user["wins"],
+                    "period_start_balance": user["period_start_balance"],
                     "last_update": user.get("last_update")
-                }
+                })
             else:
-                return {
+                return ORJSONResponse({
                     "username": username,
                     "nickname": "",
                     "balance": round(START_BALANCE, 2),
@@ -1173,96 +1599,100 @@ def get_user_me(username: str = Depends(get_current_username)):
                     "wins": 0,
                     "period_start_balance": round(START_BALANCE, 2),
                     "last_update": None
-                }
+                })
 
-@app.post("/api/user/me")
-def update_user_me(upd: UserUpdate, username: str = Depends(get_current_username)):
+def _pg_update_user_me(upd: UserUpdate, user_key: str):
+    conn = _pg_connect()
+    if not conn:
+        raise HTTPException(status_code=500, detail="Postgres connection failed")
+    try:
+        _init_schema(conn)
+        # fetch existing
+        with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+            cur.execute("SELECT username,nickname,balance,last_update,trades,wins,period_start_balance FROM users WHERE username=%s;", (user_key,))
+            row = cur.fetchone()
+        if row:
+            u = {
+                "nickname": row.get("nickname") or "",
+                "balance": float(row.get("balance")) if row.get("balance") is not None else START_BALANCE,
+                "last_update": (row.get("last_update").isoformat()+"Z") if row.get("last_update") else None,
+                "trades": int(row.get("trades") or 0),
+                "wins": int(row.get("wins") or 0),
+                "period_start_balance": float(row.get("period_start_balance")) if row.get("period_start_balance") is not None else START_BALANCE
+            }
+        else:
+            u = {
+                "nickname": "",
+                "balance": START_BALANCE,
+                "last_update": None,
+                "trades": 0,
+                "wins": 0,
+                "period_start_balance": START_BALANCE
+            }
+        changed_nick = None
+        if upd.get("nickname") is not None:
+            n = (upd.get("nickname") or "").strip()[:40]
+            if n != u.get("nickname", ""):
+                changed_nick = n
+                u["nickname"] = n
+        if upd.get("balance") is not None:
+            try:
+                u["balance"] = round(float(upd.get("balance")), 2)
+            except Exception:
+                u["balance"] = START_BALANCE
+        if upd.get("trades") is not None:
+            try:
+                u["trades"] = int(upd.get("trades"))
+            except Exception:
+                u["trades"] = int(u.get("trades", 0) or 0)
+        if upd.get("wins") is not None:
+            try:
+                u["wins"] = int(upd.get("wins"))
+            except Exception:
+                u["wins"] = int(u.get("wins", 0) or 0)
+        if upd.get("period_start_balance") is not None:
+            try:
+                u["period_start_balance"] = round(float(upd.get("period_start_balance")), 2)
+            except Exception:
+                u["period_start_balance"] = START_BALANCE
+        u["last_update"] = _now_iso()
+        _upsert_user_pg(conn, user_key, u)
+        # if changed nickname, update recent_trades nicknames (best-effort)
+        if changed_nick:
+            with conn.cursor() as cur:
+                cur.execute("UPDATE recent_trades SET nickname=%s WHERE username=%s;", (changed_nick, user_key))
+                conn.commit()
+        metrics = compute_user_metrics_from_record(u)
+        resp = {
+            "status": "ok",
+            "user": {
+                "username": user_key,
+                "nickname": u.get("nickname", "") or "",
+                "balance": metrics["balance"],
+                "performance": metrics["performance"],
+                "win_rate": metrics["win_rate"],
+                "trades_this_period": metrics["trades_this_period"],
+                "wins": metrics["wins"],
+                "period_start_balance": metrics["period_start_balance"],
+                "last_update": u.get("last_update")
+            }
+        }
+        if changed_nick:
+            resp["message"] = f"nickname set to {changed_nick}"
+        return resp
+    finally:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+@app.post("/api/user/me", openapi_extra=USER_UPDATE_DOC)
+async def update_user_me(request: Request, username: str = Depends(get_current_username)):
+    upd = await _parse_user_update(request)
     user_key = username
-    with _lock:
+    async with _lock:
         if USE_PG:
-            conn = _pg_connect()
-            if not conn:
-                raise HTTPException(status_code=500, detail="Postgres connection failed")
-            try:
-                _init_schema(conn)
-                # fetch existing
-                with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
-                    cur.execute("SELECT username,nickname,balance,last_update,trades,wins,period_start_balance FROM users WHERE username=%s;", (user_key,))
-                    row = cur.fetchone()
-                if row:
-                    u = {
-                        "nickname": row.get("nickname") or "",
-                        "balance": float(row.get("balance")) if row.get("balance") is not None else START_BALANCE,
-                        "last_update": (row.get("last_update").isoformat()+"Z") if row.get("last_update") else None,
-                        "trades": int(row.get("trades") or 0),
-                        "wins": int(row.get("wins") or 0),
-                        "period_start_balance": float(row.get("period_start_balance")) if row.get("period_start_balance") is not None else START_BALANCE
-                    }
-                else:
-                    u = {
-                        "nickname": "",
-                        "balance": START_BALANCE,
-                        "last_update": None,
-                        "trades": 0,
-                        "wins": 0,
-                        "period_start_balance": START_BALANCE
-                    }
-                changed_nick = None
-                if upd.nickname is not None:
-                    n = (upd.nickname or "").strip()[:40]
-                    if n != u.get("nickname", ""):
-                        changed_nick = n
-                        u["nickname"] = n
-                if upd.balance is not None:
-                    try:
-                        u["balance"] = round(float(upd.balance), 2)
-                    except Exception:
-                        u["balance"] = START_BALANCE
-                if upd.trades is not None:
-                    try:
-                        u["trades"] = int(upd.trades)
-                    except Exception:
-                        u["trades"] = int(u.get("trades", 0) or 0)
-                if upd.wins is not None:
-                    try:
-                        u["wins"] = int(upd.wins)
-                    except Exception:
-                        u["wins"] = int(u.get("wins", 0) or 0)
-                if upd.period_start_balance is not None:
-                    try:
-                        u["period_start_balance"] = round(float(upd.period_start_balance), 2)
-                    except Exception:
-                        u["period_start_balance"] = START_BALANCE
-                u["last_update"] = _now_iso()
-                _upsert_user_pg(conn, user_key, u)
-                # if changed nickname, update recent_trades nicknames (best-effort)
-                if changed_nick:
-                    with conn.cursor() as cur:
-                        cur.execute("UPDATE recent_trades SET nickname=%s WHERE username=%s;", (changed_nick, user_key))
-                        conn.commit()
-                metrics = compute_user_metrics_from_record(u)
-                resp = {
-                    "status": "ok",
-                    "user": {
-                        "username": user_key,
-                        "nickname": u.get("nickname", "") or "",
-                        "balance": metrics["balance"],
-                        "performance": metrics["performance"],
-                        "win_rate": metrics["win_rate"],
-                        "trades_this_period": metrics["trades_this_period"],
-                        "wins": metrics["wins"],
-                        "period_start_balance": metrics["period_start_balance"],
-                        "last_update": u.get("last_update")
-                    }
-                }
-                if changed_nick:
-                    resp["message"] = f"nickname set to {changed_nick}"
-                return resp
-            finally:
-                try:
-                    conn.close()
-                except Exception:
-                    pass
+            return ORJSONResponse(await asyncio.to_thread(_pg_update_user_me, upd, user_key))
         else:
             db = _read_db_file_fallback()
             users = db.setdefault("users", {})
@@ -1275,42 +1705,38 @@ def update_user_me(upd: UserUpdate, username: str = Depends(get_current_username
                 "period_start_balance": START_BALANCE
             })
             changed_nick = None
-            if upd.nickname is not None:
-                n = (upd.nickname or "").strip()[:40]
+            if upd.get("nickname") is not None:
+                n = (upd.get("nickname") or "").strip()[:40]
                 if n != u.get("nickname", ""):
                     changed_nick = n
                     u["nickname"] = n
-            if upd.balance is not None:
+            if upd.get("balance") is not None:
                 try:
-                    u["balance"] = round(float(upd.balance), 2)
+                    u["balance"] = round(float(upd.get("balance")), 2)
                 except Exception:
                     u["balance"] = START_BALANCE
-            if upd.trades is not None:
+            if upd.get("trades") is not None:
                 try:
-                    u["trades"] = int(upd.trades)
+                    u["trades"] = int(upd.get("trades"))
                 except Exception:
                     u["trades"] = int(u.get("trades", 0) or 0)
-            if upd.wins is not None:
+            if upd.get("wins") is not None:
                 try:
-                    u["wins"] = int(upd.wins)
+                    u["wins"] = int(upd.get("wins"))
                 except Exception:
                     u["wins"] = int(u.get("wins", 0) or 0)
-            if upd.period_start_balance is not None:
+            if upd.get("period_start_balance") is not None:
                 try:
-                    u["period_start_balance"] = round(float(upd.period_start_balance), 2)
+                    u["period_start_balance"] = round(float(upd.get("period_start_balance")), 2)
                 except Exception:
                     u["period_start_balance"] = START_BALANCE
             u["last_update"] = _now_iso()
+            metrics = _recompute(u)
+            _board_update(user_key, u)
             if changed_nick:
-                recent = db.setdefault("recent_trades", [])
-                for ent in recent:
-                    try:
-                        if ent.get("username") == user_key:
-                            ent["nickname"] = changed_nick
-                    except Exception:
-                        pass
-            _write_db_file_fallback(db)
-            metrics = compute_user_metrics_from_record(u)
+                for ent in _recent_by_user.get(user_key, ()):
+                    ent["nickname"] = changed_nick
+            _mark_dirty()
             resp = {
                 "status": "ok",
                 "user": {
@@ -1327,81 +1753,63 @@ def update_user_me(upd: UserUpdate, username: str = Depends(get_current_username
             }
             if changed_nick:
                 resp["message"] = f"nickname set to {changed_nick}"
-            return resp
+            return ORJSONResponse(resp)
 
 # ---------------------------
 # live-wins, winners, close_month endpoints
 # ---------------------------
+def _pg_get_live_wins(limit: int, minutes: Optional[int], nickname: Optional[str]):
+    conn = _pg_connect()
+    if not conn:
+        raise HTTPException(status_code=500, detail="Postgres connection failed")
+    try:
+        recent = _get_recent_trades_pg(conn, limit=limit, minutes=minutes, nickname=nickname)
+        # build summary
+        summary = {}
+        for e in recent:
+            nick = (e.get("nickname") or "")[:40]
+            key = nick if nick.strip() else 'Anon'
+            s = summary.setdefault(key, {"net": 0.0, "wins": 0, "losses": 0, "trades": 0})
+            amt = float(e.get("amount", 0.0) or 0.0)
+            if e.get("result") == "win":
+                s["net"] = round(s["net"] + amt, 2)
+                s["wins"] += 1
+            else:
+                s["net"] = round(s["net"] - amt, 2)
+                s["losses"] += 1
+            s["trades"] += 1
+        return {"recent_trades": recent, "summary": summary, "timestamp": _now_iso()}
+    finally:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
 @app.get("/api/live-wins")
-def get_live_wins(limit: int = 100, minutes: Optional[int] = None, nickname: Optional[str] = None):
+async def get_live_wins(limit: int = 100, minutes: Optional[int] = None, nickname: Optional[str] = None):
     if limit <= 0:
         raise HTTPException(status_code=400, detail="limit must be > 0")
     limit = min(limit, 500)
-    with _lock:
+    async with _lock:
         if USE_PG:
-            conn = _pg_connect()
-            if not conn:
-                raise HTTPException(status_code=500, detail="Postgres connection failed")
-            try:
-                recent = _get_recent_trades_pg(conn, limit=limit, minutes=minutes, nickname=nickname)
-                # build summary
-                summary = {}
-                for e in recent:
-                    nick = (e.get("nickname") or "")[:40]
-                    key = nick if nick.strip() else 'Anon'
-                    s = summary.setdefault(key, {"net": 0.0, "wins": 0, "losses": 0, "trades": 0})
-                    amt = float(e.get("amount", 0.0) or 0.0)
-                    if e.get("result") == "win":
-                        s["net"] = round(s["net"] + amt, 2)
-                        s["wins"] += 1
-                    else:
-                        s["net"] = round(s["net"] - amt, 2)
-                        s["losses"] += 1
-                    s["trades"] += 1
-                return {"recent_trades": recent, "summary": summary, "timestamp": _now_iso()}
-            finally:
-                try:
-                    conn.close()
-                except Exception:
-                    pass
+            return ORJSONResponse(await asyncio.to_thread(_pg_get_live_wins, limit, minutes, nickname))
         else:
             db = _read_db_file_fallback()
-            recent = list(db.get("recent_trades", []))
-            cutoff = None
+            recent = db.get("recent_trades", ())
+            cutoff_epoch = None
             if minutes is not None:
                 try:
-                    minutes = int(minutes)
-                    cutoff = datetime.now(timezone.utc) - timedelta(minutes=minutes)
+                    cutoff_epoch = int(time.time()) - int(minutes) * 60
                 except Exception:
                     raise HTTPException(status_code=400, detail="invalid minutes parameter")
-            def parse_ts(s):
-                try:
-                    if s.endswith("Z"):
-                        s2 = s[:-1]
-                        dt = datetime.fromisoformat(s2)
-                        if dt.tzinfo is None:
-                            dt = dt.replace(tzinfo=timezone.utc)
-                        return dt
-                    else:
-                        dt = datetime.fromisoformat(s)
-                        if dt.tzinfo is None:
-                            dt = dt.replace(tzinfo=timezone.utc)
-                        return dt
-                except Exception:
-                    return None
-            filtered = []
             lower_filter = nickname.lower().strip() if nickname else None
-            for entry in recent:
-                if cutoff:
-                    ts = parse_ts(entry.get("ts", ""))
-                    if not ts or ts < cutoff:
-                        continue
-                if lower_filter:
-                    if (entry.get("nickname") or "").strip().lower() != lower_filter:
-                        continue
-                filtered.append(entry)
-                if len(filtered) >= limit:
-                    break
+            # recent is newest-first, so stop as soon as `limit` entries match
+            matching = (
+                e for e in recent
+                if (cutoff_epoch is None or e.get("ts_epoch", 0) >= cutoff_epoch)
+                and (not lower_filter or (e.get("nickname") or "").strip().lower() == lower_filter)
+            )
+            filtered = list(itertools.islice(matching, limit))
             summary = {}
             for e in filtered:
                 nick = (e.get("nickname") or "")[:40]
@@ -1415,212 +1823,248 @@ def get_live_wins(limit: int = 100, minutes: Optional[int] = None, nickname: Opt
                     s["net"] = round(s["net"] - amt, 2)
                     s["losses"] += 1
                 s["trades"] += 1
-            return {"recent_trades": filtered, "summary": summary, "timestamp": _now_iso()}
+            # ts_epoch is an internal filter key; the Postgres branch never returns it
+            trades_out = [{k: v for k, v in e.items() if k != "ts_epoch"} for e in filtered]
+            return ORJSONResponse({"recent_trades": trades_out, "summary": summary, "timestamp": _now_iso()})
+
+def _pg_post_close_month():
+    conn = _pg_connect()
+    if not conn:
+        raise HTTPException(status_code=500, detail="Postgres connection failed")
+    try:
+        _init_schema(conn)
+        prev_month = _prev_month_key()
+        # check if already closed
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1 FROM monthly_winners WHERE month=%s;", (prev_month,))
+            if cur.fetchone():
+                return {"status": "already_closed", "month": prev_month}
+        # compute podium
+        with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+            cur.execute("""
+                SELECT username,nickname,balance FROM users ORDER BY balance DESC LIMIT 3;
+            """)
+            rows = cur.fetchall()
+        podium = compute_podium_snapshot_from_users_rows(rows)
+        _insert_monthly_winner_pg(conn, prev_month, podium)
+        # reset balances/trades/wins for all users
+        now_iso = _now_iso()
+        with conn.cursor() as cur:
+            cur.execute("""
+                UPDATE users SET balance=%s, period_start_balance=%s, trades=0, wins=0, last_update=%s;
+            """, (decimal.Decimal(str(START_BALANCE)), decimal.Decimal(str(START_BALANCE)), _iso_to_dt(now_iso)))
+            conn.commit()
+        return {"status": "closed", "month": prev_month, "podium": podium}
+    finally:
+        try:
+            conn.close()
+        except Exception:
+            pass
 
 @app.post("/api/close_month")
-def post_close_month():
-    with _lock:
+async def post_close_month():
+    async with _lock:
         if USE_PG:
-            conn = _pg_connect()
-            if not conn:
-                raise HTTPException(status_code=500, detail="Postgres connection failed")
-            try:
-                _init_schema(conn)
-                prev_month = _prev_month_key()
-                # check if already closed
-                with conn.cursor() as cur:
-                    cur.execute("SELECT 1 FROM monthly_winners WHERE month=%s;", (prev_month,))
-                    if cur.fetchone():
-                        return {"status": "already_closed", "month": prev_month}
-                # compute podium
-                with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
-                    cur.execute("""
-                        SELECT username,nickname,balance FROM users ORDER BY balance::numeric DESC LIMIT 3;
-                    """)
-                    rows = cur.fetchall()
-                podium = compute_podium_snapshot_from_users_rows(rows)
-                _insert_monthly_winner_pg(conn, prev_month, podium)
-                # reset balances/trades/wins for all users
-                now_iso = _now_iso()
-                with conn.cursor() as cur:
-                    cur.execute("""
-                        UPDATE users SET balance=%s, period_start_balance=%s, trades=0, wins=0, last_update=%s;
-                    """, (decimal.Decimal(str(START_BALANCE)), decimal.Decimal(str(START_BALANCE)), _iso_to_dt(now_iso)))
-                    conn.commit()
-                return {"status": "closed", "month": prev_month, "podium": podium}
-            finally:
-                try:
-                    conn.close()
-                except Exception:
-                    pass
+            return ORJSONResponse(await asyncio.to_thread(_pg_post_close_month))
         else:
             db = _read_db_file_fallback()
             prev_month = _prev_month_key()
             if prev_month in db.get("monthly_winners", {}):
-                return {"status": "already_closed", "month": prev_month}
-            podium = compute_podium_snapshot_from_users_rows(sorted(
-                [{"username": u, "nickname": v.get("nickname",""), "balance": v.get("balance", START_BALANCE)} for u,v in db.get("users", {}).items()],
-                key=lambda x: x["balance"], reverse=True)[:3])
+                return ORJSONResponse({"status": "already_closed", "month": prev_month})
+            users = db.get("users", {})
+            # top 3 straight from the leaderboard index rather than sorting every user
+            podium = compute_podium_snapshot_from_users_rows([row for _, _, row in _leaderboard.islice(0, 3)])
             db.setdefault("monthly_winners", {})[prev_month] = {"podium": podium, "closed_at": _now_iso()}
             db["last_month_closed"] = _get_month_key()
-            for uname, u in db.get("users", {}).items():
-                u["balance"] = round(float(START_BALANCE), 2)
-                u["period_start_balance"] = round(float(START_BALANCE), 2)
-                u["trades"] = 0
-                u["wins"] = 0
-                u["last_update"] = _now_iso()
-            _write_db_file_fallback(db)
-            return {"status": "closed", "month": prev_month, "podium": podium}
+            # one template applied with the C-level dict.update, including the derived
+            # metrics, so the rebuild below needn't recompute them per user
+            reset_template = {
+                "balance": round(float(START_BALANCE), 2),
+                "period_start_balance": round(float(START_BALANCE), 2),
+                "trades": 0,
+                "wins": 0,
+                "performance": 0.0,
+                "win_rate": 0.0,
+                "last_update": _now_iso()
+            }
+            for u in users.values():
+                u.update(reset_template)
+            _board_rebuild(users, recompute=False)
+            _mark_dirty()
+    # month close is durability-sensitive: persist before responding (with _lock released)
+    await _flush_db_file()
+    return ORJSONResponse({"status": "closed", "month": prev_month, "podium": podium})
+
+def _pg_get_winners(month: str):
+    conn = _pg_connect()
+    if not conn:
+        raise HTTPException(status_code=500, detail="Postgres connection failed")
+    try:
+        winners = _get_monthly_winner_pg(conn, month)
+        if not winners:
+            raise HTTPException(status_code=404, detail="No winners for that month")
+        return {"month": month, "winners": winners}
+    finally:
+        try:
+            conn.close()
+        except Exception:
+            pass
 
 @app.get("/api/winners/{month}")
-def get_winners(month: str):
-    with _lock:
+async def get_winners(month: str):
+    async with _lock:
         if USE_PG:
-            conn = _pg_connect()
-            if not conn:
-                raise HTTPException(status_code=500, detail="Postgres connection failed")
-            try:
-                winners = _get_monthly_winner_pg(conn, month)
-                if not winners:
-                    raise HTTPException(status_code=404, detail="No winners for that month")
-                return {"month": month, "winners": winners}
-            finally:
-                try:
-                    conn.close()
-                except Exception:
-                    pass
+            return ORJSONResponse(await asyncio.to_thread(_pg_get_winners, month))
         else:
             db = _read_db_file_fallback()
             winners = db.get("monthly_winners", {}).get(month)
             if not winners:
                 raise HTTPException(status_code=404, detail="No winners for that month")
-            return {"month": month, "winners": winners}
+            return ORJSONResponse({"month": month, "winners": winners})
+
+def _pg_get_latest_winners():
+    conn = _pg_connect()
+    if not conn:
+        raise HTTPException(status_code=500, detail="Postgres connection failed")
+    try:
+        all_winners = _get_all_monthly_winners_pg(conn)
+        if not all_winners:
+            return {"latest": None, "monthly_winners": {}}
+        last_month = max(all_winners)  # "YYYY-MM" keys sort chronologically
+        return {"latest": last_month, "winners": all_winners[last_month], "monthly_winners": all_winners}
+    finally:
+        try:
+            conn.close()
+        except Exception:
+            pass
 
 @app.get("/api/winners")
-def get_latest_winners():
-    with _lock:
+async def get_latest_winners():
+    async with _lock:
         if USE_PG:
-            conn = _pg_connect()
-            if not conn:
-                raise HTTPException(status_code=500, detail="Postgres connection failed")
-            try:
-                all_winners = _get_all_monthly_winners_pg(conn)
-                if not all_winners:
-                    return {"latest": None, "monthly_winners": {}}
-                last_month = sorted(all_winners.keys())[-1]
-                return {"latest": last_month, "winners": all_winners[last_month], "monthly_winners": all_winners}
-            finally:
-                try:
-                    conn.close()
-                except Exception:
-                    pass
+            return ORJSONResponse(await asyncio.to_thread(_pg_get_latest_winners))
         else:
             db = _read_db_file_fallback()
             mw = db.get("monthly_winners", {})
             if not mw:
-                return {"latest": None, "monthly_winners": {}}
-            last_month = sorted(mw.keys())[-1]
-            return {"latest": last_month, "winners": mw[last_month], "monthly_winners": mw}
+                return ORJSONResponse({"latest": None, "monthly_winners": {}})
+            last_month = max(mw)
+            return ORJSONResponse({"latest": last_month, "winners": mw[last_month], "monthly_winners": mw})
+
+def _pg_record_trade_by_key(tr: TradeRecord, user_key: str):
+    conn = _pg_connect()
+    if not conn:
+        raise HTTPException(status_code=500, detail="Postgres connection failed")
+    try:
+        _init_schema(conn)
+        with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+            cur.execute("SELECT username,nickname,balance,last_update,trades,wins,period_start_balance FROM users WHERE username=%s;", (user_key,))
+            row = cur.fetchone()
+        if row:
+            u = {
+                "nickname": row.get("nickname") or "",
+                "balance": float(row.get("balance") or START_BALANCE),
+                "last_update": (row.get("last_update").isoformat()+"Z") if row.get("last_update") else None,
+                "trades": int(row.get("trades") or 0),
+                "wins": int(row.get("wins") or 0),
+                "period_start_balance": float(row.get("period_start_balance") or START_BALANCE)
+            }
+        else:
+            u = {
+                "nickname": "",
+                "balance": START_BALANCE,
+                "last_update": None,
+                "trades": 0,
+                "wins": 0,
+                "period_start_balance": START_BALANCE
+            }
+        changed_nick = None
+        if tr.get("nickname") is not None:
+            n = (tr.get("nickname") or "").strip()[:40]
+            if n != u.get("nickname", ""):
+                changed_nick = n
+                u["nickname"] = n
+        u.setdefault("trades", 0)
+        u.setdefault("wins", 0)
+        u.setdefault("period_start_balance", START_BALANCE)
+        u.setdefault("balance", START_BALANCE)
+        res = (tr.get("result") or "").lower()
+        if res not in ("win", "lose"):
+            raise HTTPException(status_code=400, detail='result must be "win" or "lose"')
+        u["trades"] = int(u.get("trades", 0)) + 1
+        if res == "win":
+            u["wins"] = int(u.get("wins", 0)) + 1
+        amt = 0.0
+        if tr.get("amount") is not None:
+            try:
+                amt = float(tr.get("amount"))
+            except Exception:
+                amt = 0.0
+        if tr.get("amount") is not None:
+            # a loss subtracts; persists to PG via upsert
+            u["balance"] = _trade_balance(u.get("balance", START_BALANCE), res, amt)
+        u["last_update"] = _now_iso()
+        _upsert_user_pg(conn, user_key, u, commit=False)
+        trade_entry = {
+            "ts": u["last_update"],
+            "username": user_key,
+            "nickname": u.get("nickname", "") or "",
+            "result": res,
+            "amount": round(amt, 2)
+        }
+        _insert_recent_trade_pg(conn, trade_entry)
+        metrics = compute_user_metrics_from_record(u)
+        resp = {
+            "status": "ok",
+            "user": {
+                "username": user_key,
+                "nickname": u.get("nickname", "") or "",
+                "balance": metrics["balance"],
+                "performance": metrics["performance"],
+                "win_rate": metrics["win_rate"],
+                "trades_this_period": metrics["trades_this_period"],
+                "wins": metrics["wins"],
+                "period_start_balance": metrics["period_start_balance"],
+                "last_update": u.get("last_update")
+            }
+        }
+        if changed_nick:
+            resp["message"] = f"nickname set to {changed_nick}"
+        return resp
+    finally:
+        try:
+            conn.close()
+        except Exception:
+            pass
 
-@app.post("/api/user/{user_key}/trade")
-def record_trade_by_key(user_key: str, tr: TradeRecord = Body(...), authorization: Optional[str] = Header(None)):
-    auth_username = _get_db_and_user_from_token(authorization)
+@app.post("/api/user/{user_key}/trade", openapi_extra=TRADE_RECORD_DOC)
+async def record_trade_by_key(user_key: str, request: Request, authorization: Optional[str] = Header(None)):
+    tr = await _parse_trade_record(request)
+    auth_username = await _get_db_and_user_from_token(authorization)
     if auth_username and auth_username != user_key:
         raise HTTPException(status_code=403, detail="token does not match username")
     user_key = user_key or 'guest'
-    with _lock:
+    async with _lock:
         # Reuse record_trade_me flow but without auth dependency
         if USE_PG:
-            conn = _pg_connect()
-            if not conn:
-                raise HTTPException(status_code=500, detail="Postgres connection failed")
-            try:
-                _init_schema(conn)
-                with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
-                    cur.execute("SELECT username,nickname,balance,last_update,trades,wins,period_start_balance FROM users WHERE username=%s;", (user_key,))
-                    row = cur.fetchone()
-                if row:
-                    u = {
-                        "nickname": row.get("nickname") or "",
-                        "balance": float(row.get("balance") or START_BALANCE),
-                        "last_update": (row.get("last_update").isoformat()+"Z") if row.get("last_update") else None,
-                        "trades": int(row.get("trades") or 0),
-                        "wins": int(row.get("wins") or 0),
-                        "period_start_balance": float(row.get("period_start_balance") or START_BALANCE)
-                    }
-                else:
-                    u = {
-                        "nickname": "",
-                        "balance": START_BALANCE,
-                        "last_update": None,
-                        "trades": 0,
-                        "wins": 0,
-                        "period_start_balance": START_BALANCE
-                    }
-                changed_nick = None
-                if tr.nickname is not None:
-                    n = (tr.nickname or "").strip()[:40]
-                    if n != u.get("nickname", ""):
-                        changed_nick = n
-                        u["nickname"] = n
-                u.setdefault("trades", 0)
-                u.setdefault("wins", 0)
-                u.setdefault("period_start_balance", START_BALANCE)
-                u.setdefault("balance", START_BALANCE)
-                res = (tr.result or "").lower()
-                if res not in ("win", "lose"):
-                    raise HTTPException(status_code=400, detail='result must be "win" or "lose"')
-                u["trades"] = int(u.get("trades", 0)) + 1
-                if res == "win":
-                    u["wins"] = int(u.get("wins", 0)) + 1
-                amt = 0.0
-                if tr.amount is not None:
-                    try:
-                        amt = float(tr.amount)
-                    except Exception:
-                        amt = 0.0
-                if tr.amount is not None:
-                    if res == "win":
-                        u["balance"] = round(float(u.get("balance", START_BALANCE)) + amt, 2)
-                    else:
-                        # subtract on loss, persists to PG via upsert
-                        u["balance"] = round(float(u.get("balance", START_BALANCE)) - amt, 2)
-                u["last_update"] = _now_iso()
-                _upsert_user_pg(conn, user_key, u)
-                trade_entry = {
-                    "ts": u["last_update"],
-                    "username": user_key,
-                    "nickname": u.get("nickname", "") or "",
-                    "result": res,
-                    "amount": round(amt, 2)
-                }
-                _insert_recent_trade_pg(conn, trade_entry)
-                metrics = compute_user_metrics_from_record(u)
-                resp = {
-                    "status": "ok",
-                    "user": {
-                        "username": user_key,
-                        "nickname": u.get("nickname", "") or "",
-                        "balance": metrics["balance"],
-                        "performance": metrics["performance"],
-                        "win_rate": metrics["win_rate"],
-                        "trades_this_period": metrics["trades_this_period"],
-                        "wins": metrics["wins"],
-                        "period_start_balance": metrics["period_start_balance"],
-                        "last_update": u.get("last_update")
-                    }
-                }
-                if changed_nick:
-                    resp["message"] = f"nickname set to {changed_nick}"
-                return resp
-            finally:
-                try:
-                    conn.close()
-                except Exception:
-                    pass
+            return ORJSONResponse(await asyncio.to_thread(_pg_record_trade_by_key, tr, user_key))
         else:
+            # validate before touching the cached DB so a rejected trade leaves no partial update
+            res = (tr.get("result") or "").lower()
+            if res not in ("win", "lose"):
+                raise HTTPException(status_code=400, detail='result must be "win" or "lose"')
             db = _read_db_file_fallback()
             users = db.setdefault("users", {})
+            amt = 0.0
+            if tr.get("amount") is not None:
+                try:
+                    amt = float(tr.get("amount"))
+                except Exception:
+                    amt = 0.0
+            new_balance = None
+            if tr.get("amount") is not None:
+                prev = users.get(user_key) or {}
+                new_balance = _trade_balance(prev.get("balance", START_BALANCE), res, amt)
             u = users.setdefault(user_key, {
                 "nickname": "",
                 "balance": START_BALANCE,
@@ -1630,54 +2074,35 @@ def record_trade_by_key(user_key: str, tr: TradeRecord = Body(...), authorizatio
                 "period_start_balance": START_BALANCE
             })
             changed_nick = None
-            if tr.nickname is not None:
-                n = (tr.nickname or "").strip()[:40]
+            if tr.get("nickname") is not None:
+                n = (tr.get("nickname") or "").strip()[:40]
                 if n != u.get("nickname", ""):
                     changed_nick = n
                     u["nickname"] = n
-                    recent = db.setdefault("recent_trades", [])
-                    for ent in recent:
-                        try:
-                            if ent.get("username") == user_key:
-                                ent["nickname"] = changed_nick
-                        except Exception:
-                            pass
+                    for ent in _recent_by_user.get(user_key, ()):
+                        ent["nickname"] = changed_nick
             u.setdefault("trades", 0)
             u.setdefault("wins", 0)
             u.setdefault("period_start_balance", START_BALANCE)
             u.setdefault("balance", START_BALANCE)
-            res = (tr.result or "").lower()
-            if res not in ("win", "lose"):
-                raise HTTPException(status_code=400, detail='result must be "win" or "lose"')
             u["trades"] = int(u.get("trades", 0)) + 1
             if res == "win":
                 u["wins"] = int(u.get("wins", 0)) + 1
-            amt = 0.0
-            if tr.amount is not None:
-                try:
-                    amt = float(tr.amount)
-                except Exception:
-                    amt = 0.0
-            if tr.amount is not None:
-                if res == "win":
-                    u["balance"] = round(float(u.get("balance", START_BALANCE)) + amt, 2)
-                else:
-                    u["balance"] = round(float(u.get("balance", START_BALANCE)) - amt, 2)
+            if new_balance is not None:
+                u["balance"] = new_balance
             u["last_update"] = _now_iso()
+            metrics = _recompute(u)
+            _board_update(user_key, u)
             trade_entry = {
                 "ts": u["last_update"],
+                "ts_epoch": int(time.time()),  # lets live-wins filter by int compare
                 "username": user_key,
                 "nickname": u.get("nickname", "") or "",
                 "result": res,
                 "amount": round(amt, 2)
             }
-            recent = db.setdefault("recent_trades", [])
-            recent.insert(0, trade_entry)
-            MAX_RECENT_TRADES = 500
-            if len(recent) > MAX_RECENT_TRADES:
-                del recent[MAX_RECENT_TRADES:]
-            _write_db_file_fallback(db)
-            metrics = compute_user_metrics_from_record(u)
+            _recent_add(db, trade_entry)
+            _mark_dirty()
             resp = {
                 "status": "ok",
                 "user": {
@@ -1694,4 +2119,15 @@ def record_trade_by_key(user_key: str, tr: TradeRecord = Body(...), authorizatio
             }
             if changed_nick:
                 resp["message"] = f"nickname set to {changed_nick}"
-            return resp
+            return ORJSONResponse(resp)
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(
+        "main:app",
+        host=os.environ.get("HOST", "0.0.0.0"),
+        port=int(os.environ.get("PORT", 8000)),
+        loop="uvloop",
+        http="httptools",
+        workers=int(os.environ.get("WEB_CONCURRENCY", 1)),
+    )